@@ -35,6 +35,12 @@ CHUNK_OVERLAP = 100
 # Retrieval
 LIGHTRAG_K = 6
 
+# Session working set (follow-up questions reuse recently retrieved chunks)
+WORKING_SET_SIZE = 48           # Max chunks kept per session
+WORKING_SET_MIN_RELEVANCE = 0.6 # Working set hits must score at least this to skip the full index
+FOLLOW_UP_MIN_RELEVANCE = 0.75  # Query must score at least this against the last full-search query to use the working set
+PREFETCH_PAGE_RADIUS = 1        # Neighbouring pages (+/-) prefetched from each retrieved source
+
 # Models
 # Ensure these match your remote server (admin) and Jetson (user)
 DEFAULT_MODEL = "llama3.2:3b"
@@ -8,22 +8,210 @@ Provides:
 This is a fairly simplified implementation of the above research paper + github focusing on
 Enhancing retrieval via scoring, simple reranking based on relevance scoring, Evidence-based answer
 generation, & overlap scoring for transparency.
+
+Each LightRAG instance serves one chat session and keeps a working set of recently retrieved
+chunks (with their embeddings). Follow-up questions are scored against the working set first and
+only go to the full index when coverage is weak (the question drifted from the one that filled
+the working set, or too few cached chunks match). Neighbouring pages of retrieved sources are
+prefetched into the working set while the answer is generating.
 """
 
+import os
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Tuple
+import numpy as np
 from langchain_core.documents import Document
-from config import LIGHTRAG_K, LIGHTRAG_PROMPT
+from config import (LIGHTRAG_K, LIGHTRAG_PROMPT, WORKING_SET_SIZE, WORKING_SET_MIN_RELEVANCE,
+                    FOLLOW_UP_MIN_RELEVANCE, PREFETCH_PAGE_RADIUS)
 
 class LightRAG:
-    def __init__(self, llm, db, top_k: int = LIGHTRAG_K):
+    def __init__(self, llm, db, top_k: int = LIGHTRAG_K,
+                 working_set_size: int = WORKING_SET_SIZE,
+                 min_relevance: float = WORKING_SET_MIN_RELEVANCE,
+                 follow_up_relevance: float = FOLLOW_UP_MIN_RELEVANCE):
         self.llm = llm
         self.db = db
         self.top_k = top_k
-    
+        self.working_set_size = working_set_size
+        self.min_relevance = min_relevance
+        self.follow_up_relevance = follow_up_relevance
+
+        # Same relevance function as similarity_search_with_relevance_scores;
+        # the space only picks the local distance formula for the working set
+        self._relevance_fn = db._select_relevance_score_fn()
+        self.space = self._collection_space()
+        if self.space not in ("l2", "ip", "cosine"):
+            raise ValueError(f"Unsupported distance space: {self.space}")
+
+        # chunk id -> (Document, embedding), oldest first.
+        # No lock: the prefetch thread is the only other writer and retrieve()/reset_working_set()
+        # join it before touching the working set.
+        self.working_set: "OrderedDict[str, Tuple[Document, np.ndarray]]" = OrderedDict()
+        self._matrix = None         # Stacked working set embeddings, rebuilt after changes
+        self._anchor = None         # Query embedding of the last full index search
+        self._prefetch_thread = None
+
+    def _collection_space(self) -> str:
+        """Distance space of the Chroma collection (newer Chroma keeps it in the configuration)."""
+        collection = self.db._collection
+        try:
+            hnsw = (collection.configuration or {}).get("hnsw") or {}
+            if hnsw.get("space"):
+                return hnsw["space"]
+        except AttributeError:
+            pass
+        return (collection.metadata or {}).get("hnsw:space", "l2")
+
+    def _wait_for_prefetch(self):
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+
+    def reset_working_set(self):
+        """Drop all cached chunks (e.g. when the session changes topic or restarts)."""
+        self._wait_for_prefetch()
+        self.working_set.clear()
+        self._matrix = None
+        self._anchor = None
+
+    def _distances(self, query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """Distances from the query to every row of matrix in the collection's space."""
+        if self.space == "l2":
+            diff = matrix - query
+            return np.einsum("ij,ij->i", diff, diff)
+        dots = matrix @ query
+        if self.space == "ip":
+            return 1.0 - dots
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        return 1.0 - np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+    def _put(self, chunk_id: str, doc: Document, emb):
+        self.working_set[chunk_id] = (doc, np.asarray(emb, dtype=np.float32))
+        self._matrix = None
+
+    def _evict(self):
+        while len(self.working_set) > self.working_set_size:
+            self.working_set.popitem(last=False)
+            self._matrix = None
+
+    def _remember(self, ids: List[str], docs: List[Document], embeddings: List[List[float]]):
+        """Insert chunks into the working set, evicting the least recently used."""
+        for chunk_id, doc, emb in zip(ids, docs, embeddings):
+            self._put(chunk_id, doc, emb)
+            self.working_set.move_to_end(chunk_id)
+        self._evict()
+
+    def _search_working_set(self, query_embedding: np.ndarray) -> List[Tuple[Document, float]]:
+        """
+        Score the working set against the query. Returns [] when coverage is weak: the query
+        has drifted from the one that filled the working set, or too few cached chunks match.
+        """
+        if self._anchor is None or len(self.working_set) < self.top_k:
+            return []
+
+        # Relative gate: only trust the working set for follow-ups on the same topic
+        anchor_distance = self._distances(query_embedding, self._anchor[np.newaxis, :])[0]
+        if self._relevance_fn(float(anchor_distance)) < self.follow_up_relevance:
+            return []
+
+        if self._matrix is None:
+            self._matrix = np.stack([emb for _, emb in self.working_set.values()])
+        scores = [self._relevance_fn(float(d)) for d in self._distances(query_embedding, self._matrix)]
+
+        ids = list(self.working_set)
+        hits = sorted(
+            (i for i, score in enumerate(scores) if score >= self.min_relevance),
+            key=lambda i: scores[i], reverse=True
+        )[:self.top_k]
+        if len(hits) < self.top_k:
+            return []
+
+        for i in hits:
+            self.working_set.move_to_end(ids[i])
+        return [(self.working_set[ids[i]][0], scores[i]) for i in hits]
+
+    def _search_index(self, query_embedding: np.ndarray) -> List[Tuple[Document, float]]:
+        """Full vector search, reusing the query embedding and caching the results."""
+        results = self.db._collection.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=self.top_k,
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return []
+
+        ids = results["ids"][0]
+        docs = [
+            Document(id=chunk_id, page_content=text, metadata=meta or {})
+            for chunk_id, text, meta in zip(ids, results["documents"][0], results["metadatas"][0])
+        ]
+        self._remember(ids, docs, results["embeddings"][0])
+        self._anchor = query_embedding
+        return [(doc, self._relevance_fn(dist)) for doc, dist in zip(docs, results["distances"][0])]
+
+    def prefetch_neighbours(self, docs_with_scores: List[Tuple[Document, float]]):
+        """
+        Load chunks from the same source on neighbouring pages into the working set.
+        Closest pages win, and the retrieved chunks are never evicted to make room.
+        """
+        retrieved_ids = [doc.id for doc, _ in docs_with_scores if doc.id]
+        budget = self.working_set_size - len(retrieved_ids)
+
+        pages_by_source: Dict[str, set] = {}
+        for doc, _ in docs_with_scores:
+            source, page = doc.metadata.get("source"), doc.metadata.get("page")
+            if source is None or not isinstance(page, int):
+                continue
+            pages_by_source.setdefault(source, set()).add(page)
+        if budget <= 0 or not pages_by_source:
+            return
+
+        # (page distance, id, Document, embedding) for chunks not already cached
+        candidates = []
+        for source, pages in pages_by_source.items():
+            wanted = {
+                p for page in pages
+                for p in range(max(0, page - PREFETCH_PAGE_RADIUS), page + PREFETCH_PAGE_RADIUS + 1)
+            }
+            try:
+                found = self.db.get(
+                    where={"$and": [{"source": source}, {"page": {"$in": sorted(wanted)}}]},
+                    include=["documents", "metadatas", "embeddings"],
+                )
+            except Exception as e:
+                print(f"Warning: Prefetch failed for {source}: {e}")
+                continue
+
+            for chunk_id, text, meta, emb in zip(found["ids"], found["documents"],
+                                                 found["metadatas"], found["embeddings"]):
+                if chunk_id in self.working_set:
+                    continue
+                meta = meta or {}
+                distance = min(abs(meta.get("page", 0) - page) for page in pages)
+                candidates.append((distance, chunk_id, Document(id=chunk_id, page_content=text, metadata=meta), emb))
+
+        candidates.sort(key=lambda c: c[0])
+        candidates = candidates[:budget]
+
+        # Farthest first so the closest neighbours sit just below the retrieved chunks
+        for _, chunk_id, doc, emb in reversed(candidates):
+            self._put(chunk_id, doc, emb)
+        for chunk_id in retrieved_ids:
+            if chunk_id in self.working_set:
+                self.working_set.move_to_end(chunk_id)
+        self._evict()
+
     def retrieve(self, query: str) -> List[Tuple[Document, float]]:
-        """Retrieve documents with relevance scores."""
-        # Silence potential Chroma warnings
-        return self.db.similarity_search_with_relevance_scores(query, k=self.top_k)
+        """Retrieve documents with relevance scores, preferring the session working set."""
+        # Wait for the previous turn's prefetch so follow-ups see its neighbours
+        self._wait_for_prefetch()
+
+        query_embedding = np.asarray(self.db.embeddings.embed_query(query), dtype=np.float32)
+        docs = self._search_working_set(query_embedding)
+        if docs:
+            return docs
+        return self._search_index(query_embedding)
     
     def rerank(self, docs_with_scores: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
         """Heuristic Reranking based on content length."""
@@ -89,6 +277,12 @@ class LightRAG:
         
         reranked_docs = self.rerank(docs)
         prompt = self.build_prompt(query, reranked_docs)
+
+        # Prefetch neighbouring pages while the LLM is busy
+        self._prefetch_thread = threading.Thread(
+            target=self.prefetch_neighbours, args=(reranked_docs,), daemon=True
+        )
+        self._prefetch_thread.start()
         
         # Direct invoke, no chains
         response = self.llm.invoke(prompt)
@@ -56,6 +56,14 @@ if st.session_state.rag_system is None:
         st.error(f"Database not found at {CHROMA_DIR}.")
         st.info("Please transfer 'chroma_db.zip' from the Admin console and extract it to 'storage/chroma'.")
 
+# --- New Chat ---
+if st.sidebar.button("New Chat"):
+    # Start a fresh session so follow-ups aren't scored against the old topic's chunks
+    st.session_state.messages = []
+    st.session_state.session_id = "user_" + os.urandom(4).hex()
+    if st.session_state.rag_system:
+        st.session_state.rag_system.reset_working_set()
+
 # --- Chat ---
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):